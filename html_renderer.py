@@ -3,50 +3,603 @@ import os
 import json
 import tempfile
 import traceback
+import atexit
+import shutil
+import shlex
+import asyncio
+import threading
+import contextlib
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Optional, Tuple, List, Callable
+# 注：可直接用pillow-simd替换Pillow（API完全兼容），Image.fromarray/save会自动走其AVX2加速路径
 from PIL import Image
 import numpy as np
 import re
+import io
+import base64
+import mimetypes
 import uuid
-from html2image import Html2Image
+import functools
+import hashlib
+import urllib.parse
+import urllib.request
+import time
+import concurrent.futures
+from collections import OrderedDict
 
-class HTMLFrameRenderer:
+# 可选：fcntl（仅类Unix）用于reflink复制文件
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 可选：orjson存在时用于序列化JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Chromium启动参数（容器环境下减少调度、字体和后台任务开销）
+_CHROMIUM_FLAGS = [
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--hide-scrollbars',
+    '--mute-audio',
+    '--disable-background-networking',
+    '--disable-features=TranslateUI',
+    '--disable-background-timer-throttling',
+    '--disable-renderer-backgrounding',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-ipc-flooding-protection',
+    '--disable-extensions',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--force-color-profile=srgb',
+    '--font-render-hinting=none',
+]
+
+# 简单模板：纯软件光栅化即可
+_LIGHT_FLAGS = ['--disable-gpu']
+# 含CSS动画/滤镜的模板：使用SwiftShader软件GL，模糊、阴影等效果走合成器加速路径
+_HEAVY_FLAGS = ['--use-gl=swiftshader', '--enable-accelerated-2d-canvas']
+_HEAVY_CSS_RE = re.compile(r'(?:animation|filter)\s*:', re.IGNORECASE)
+
+# 快速模式：禁用远程字体，并统一回退到系统字体
+_FAST_MODE_FLAGS = ['--disable-remote-fonts']
+_FAST_MODE_CSS = "<style>* { font-family: sans-serif !important; }</style>"
+_FONT_FACE_RE = re.compile(r"@font-face\s*\{[^}]*\}")
+
+
+def _chromium_flags(fast_mode: bool = False, template_html: str = "",
+                    chrome_flags: str = "") -> Tuple[str, ...]:
     """
-    ComfyUI节点：HTML模板渲染器（包含Chromium截图截断修复）
+    返回本次渲染使用的Chromium启动参数
     
-    输入:
-        - image: 输入图像 (IMAGE类型)
-        - title: 标题文本 (STRING类型)
-        - text: 正文文本 (STRING类型)
-        - template_html: HTML模板内容 (STRING类型)
-        - ext_json: 扩展参数的JSON字符串 (STRING类型，可选)
-        - output_width: 输出宽度 (INT类型，默认1080)
-        - output_height: 输出高度 (INT类型，默认1920)
+    模板含animation/filter样式时使用重负载参数，否则禁用GPU；
+    chrome_flags为用户追加的参数（按shell规则分隔，支持引号包裹含空格的值），排在最后以覆盖默认值
+    """
+    flags = list(_CHROMIUM_FLAGS)
+    flags += _HEAVY_FLAGS if _HEAVY_CSS_RE.search(template_html) else _LIGHT_FLAGS
+    if fast_mode:
+        flags += _FAST_MODE_FLAGS
+    flags += shlex.split(chrome_flags)
+    return tuple(flags)
+
+
+def _apply_fast_mode(template_html: str) -> str:
+    """快速模式：移除@font-face声明（字体不再预取和加载），并插入系统字体覆盖样式"""
+    template_html = _FONT_FACE_RE.sub("", template_html)
+    if "</head>" in template_html:
+        return template_html.replace("</head>", f"{_FAST_MODE_CSS}</head>", 1)
+    return _FAST_MODE_CSS + template_html
+
+
+def _loads_json(text: str) -> Any:
+    """解析JSON参数：空串和默认值"{}"直接返回新的空字典，跳过JSON解析"""
+    text = text.strip()
+    if text in ("", "{}"):
+        return {}
+    return json.loads(text)
+
+
+def _parse_ext_json(ext_json: str) -> Dict[str, Any]:
+    """解析ext_json扩展参数，格式错误或不是JSON对象时警告并返回空字典"""
+    try:
+        ext_params = _loads_json(ext_json)
+    except json.JSONDecodeError:
+        ext_params = None
+    if not isinstance(ext_params, dict):
+        print("警告: ext_json解析失败，使用空字典")
+        return {}
+    return ext_params
+
+
+def _dumps_json(obj: Any) -> str:
+    """紧凑序列化JSON（非ASCII字符原样保留），优先使用orjson"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode()
+        except TypeError:  # orjson不支持的类型（如超过64位的整数）交给标准库
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+# 后台常驻事件循环：所有Playwright操作都在该线程执行，ComfyUI的同步节点通过_run_coro调用
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """获取后台事件循环，首次调用时启动守护线程"""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="html-renderer-loop", daemon=True).start()
+        return _LOOP
+
+
+def _run_coro(coro, timeout: Optional[float] = None):
+    """在后台事件循环上运行协程并同步等待结果（保持ComfyUI节点的同步接口）"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+class _BrowserPool:
+    """
+    常驻Playwright浏览器池（运行在后台事件循环上）
     
-    输出:
-        - image: 渲染后的图像 (IMAGE类型)
-        - image_path: 图像保存路径 (STRING类型)
+    浏览器按启动参数分组缓存，跨节点、跨调用复用；每组最多max_browsers个Chromium进程，
+    借出时优先选择负载最低的浏览器，全部忙碌且未达上限时才启动新的。
+    参数组超过max_flag_groups时，关闭最久未使用的组中的空闲浏览器。
+    每次渲染借出一个独立context的page，同时打开的page数由信号量限制
     """
     
-    # Chromium截图高度偏移补偿（修复截断问题）
-    CHROMIUM_HEIGHT_OFFSET = 87
+    def __init__(self, max_pages: int, max_browsers: int, max_flag_groups: int = 4):
+        self._max_pages = max_pages
+        self._max_browsers = max_browsers
+        self._max_flag_groups = max_flag_groups
+        self._playwright = None
+        # 按最近使用顺序排列的参数组：{启动参数: [浏览器, ...]}
+        self._browsers: "OrderedDict[Tuple[str, ...], List[Any]]" = OrderedDict()
+        # 各浏览器正在使用中的借出数：{id(browser): 数量}
+        self._active: Dict[int, int] = {}
+        # asyncio原语需在后台事件循环内创建
+        self._launch_lock = None
+        self._semaphore = None
     
-    @classmethod
-    def INPUT_TYPES(cls):
-        return {
-            "required": {
-                "image": ("IMAGE",),
-                "title": ("STRING", {
-                    "default": "默认标题",
-                    "multiline": False
-                }),
-                "text": ("STRING", {
-                    "default": "默认正文内容",
-                    "multiline": True
-                }),
-                "template_html": ("STRING", {
-                    "default": """<!DOCTYPE html>
+    async def get_browser(self, flags: Tuple[str, ...]):
+        """借出一个常驻Chromium浏览器（用完需调用release_browser），首次调用时启动"""
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            browsers = [b for b in self._browsers.get(flags, []) if b.is_connected()]
+            browser = min(browsers, key=lambda b: self._active.get(id(b), 0), default=None)
+            if browser is None or (self._active.get(id(browser), 0) > 0
+                                   and len(browsers) < self._max_browsers):
+                if self._playwright is None:
+                    from playwright.async_api import async_playwright
+                    self._playwright = await async_playwright().start()
+                browser = await self._playwright.chromium.launch(headless=True, args=list(flags))
+                browsers.append(browser)
+            self._browsers[flags] = browsers
+            self._browsers.move_to_end(flags)
+            self._active[id(browser)] = self._active.get(id(browser), 0) + 1
+            await self._evict_idle_groups()
+            return browser
+    
+    async def _evict_idle_groups(self):
+        """参数组超过上限时，从最久未使用的组开始关闭空闲浏览器（仍有借出的浏览器保留到下次检查）"""
+        for flags in list(self._browsers)[:-1]:
+            if len(self._browsers) <= self._max_flag_groups:
+                break
+            busy = []
+            for browser in self._browsers[flags]:
+                if self._active.get(id(browser), 0) > 0:
+                    busy.append(browser)
+                    continue
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+            if busy:
+                self._browsers[flags] = busy
+            else:
+                del self._browsers[flags]
+    
+    def release_browser(self, browser):
+        """归还get_browser借出的浏览器"""
+        remaining = self._active.get(id(browser), 0) - 1
+        if remaining > 0:
+            self._active[id(browser)] = remaining
+        else:
+            self._active.pop(id(browser), None)
+    
+    @contextlib.asynccontextmanager
+    async def page(self, flags: Tuple[str, ...], width: int, height: int):
+        """借出一个page（独立context），退出时关闭"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_pages)
+        async with self._semaphore:
+            browser = await self.get_browser(flags)
+            try:
+                context = await browser.new_context(
+                    viewport={"width": width, "height": height},
+                    device_scale_factor=1
+                )
+                try:
+                    yield await context.new_page()
+                finally:
+                    await context.close()
+            finally:
+                self.release_browser(browser)
+    
+    async def close(self):
+        """关闭所有浏览器和Playwright驱动"""
+        for browsers in self._browsers.values():
+            for browser in browsers:
+                try:
+                    await browser.close()
+                except Exception:
+                    pass
+        self._browsers.clear()
+        self._active.clear()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+# 每组启动参数最多 cpu/4 个浏览器进程（至少1个），多个ComfyUI队列并发时分摊截图负载
+_POOL = _BrowserPool(max_pages=min(os.cpu_count() or 1, 4),
+                     max_browsers=max(1, (os.cpu_count() or 1) // 4))
+
+
+def _shutdown_pool():
+    """进程退出时关闭常驻浏览器"""
+    if _LOOP is not None:
+        try:
+            _run_coro(_POOL.close(), timeout=10)
+        except Exception:
+            pass
+
+
+atexit.register(_shutdown_pool)
+
+
+async def _warm_up_browser(flags: Tuple[str, ...]):
+    """预先启动指定参数的浏览器（借出后立即归还）"""
+    _POOL.release_browser(await _POOL.get_browser(flags))
+
+
+# 进程内复用的临时目录（避免每次调用mkdtemp/rmtree）
+_TEMP_DIR = None
+
+
+def _get_temp_dir() -> str:
+    """获取渲染用的临时目录，首次调用时创建，进程退出时清理（Linux下放在/dev/shm内存盘，省去磁盘IO）"""
+    global _TEMP_DIR
+    if _TEMP_DIR is None:
+        shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+        _TEMP_DIR = tempfile.mkdtemp(prefix="comfyui_html_render_", dir=shm_dir)
+        atexit.register(shutil.rmtree, _TEMP_DIR, ignore_errors=True)
+    return _TEMP_DIR
+
+
+# 文件复制缓冲区大小和Linux的FICLONE ioctl编号
+_COPY_BUFFER_SIZE = 1024 * 1024
+_FICLONE = 0x40049409
+
+
+def _fast_copy(src: str, dst: str) -> None:
+    """
+    复制文件：同一文件系统优先硬链接（零拷贝），其次reflink（btrfs/xfs等瞬间完成），
+    最后用1MiB缓冲区复制并保留元数据
+
+    dst已是src本身（如同一硬链接）时直接返回；其余情况先写入目标目录下的临时文件再替换，
+    不会原地截断dst（dst与src共享inode时截断会连同源文件一起清空）
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return
+    try:
+        os.link(src, dst)
+        return
+    except OSError:
+        pass
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(dst)),
+                            f".{os.path.basename(dst)}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+            try:
+                if fcntl is None:
+                    raise OSError("不支持reflink")
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except OSError:
+                shutil.copyfileobj(fsrc, fdst, length=_COPY_BUFFER_SIZE)
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_html(path: str, html: str) -> None:
+    """以二进制方式写入HTML：整体编码一次后直接写入，不经过文本IO层的分块编码"""
+    with open(path, 'wb') as f:
+        f.write(html.encode('utf-8'))
+
+
+# 远程资源（字体、背景图等）的本地镜像目录
+_ASSET_CACHE_DIR = Path.home() / ".cache" / "comfyui_html_renderer"
+_ASSET_URL_RE = re.compile(r"""url\(\s*['"]?(https?://[^'")\s]+)""")
+_FONT_MIME_TYPES = {".ttf": "font/ttf", ".otf": "font/otf", ".woff": "font/woff", ".woff2": "font/woff2"}
+
+
+# 下载超时（秒，作用于单次socket读写而非整个下载）和下载失败资源的重试间隔（秒）
+_ASSET_FETCH_TIMEOUT = 5
+_ASSET_RETRY_INTERVAL = 300
+# 下载失败的资源：{URL: 失败时间}，重试间隔内的渲染直接跳过，不再等待超时
+_FAILED_ASSETS: Dict[str, float] = {}
+
+
+def _asset_path(url: str) -> Path:
+    """远程资源在本地缓存目录中的路径"""
+    suffix = os.path.splitext(urllib.parse.urlparse(url).path)[1]
+    return _ASSET_CACHE_DIR / (hashlib.sha1(url.encode("utf-8")).hexdigest() + suffix)
+
+
+def _fetch_asset(url: str) -> str:
+    """下载远程资源到本地缓存目录（已缓存则直接返回），返回本地路径"""
+    local_path = _asset_path(url)
+    if not local_path.exists():
+        _ASSET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        request = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=_ASSET_FETCH_TIMEOUT) as response:
+            data = response.read()
+        # 先写临时文件再改名，避免并发/中断留下不完整的缓存
+        tmp_path = local_path.with_name(local_path.name + f".{uuid.uuid4().hex[:8]}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, local_path)
+    return str(local_path)
+
+
+def _localize_assets(template_html: str) -> Dict[str, str]:
+    """
+    预取模板中url(...)引用的远程资源到本地缓存，返回 {原始URL: 本地路径}
+    
+    模板本身不做改写：页面以file://加载，改写成file://的字体会被Chromium的CORS检查拦截，
+    因此保留原始https地址，渲染时由_route_assets拦截请求并直接返回本地缓存。
+    未缓存的资源并行下载；下载失败的资源在重试间隔内跳过（交给浏览器按原地址加载）
+    """
+    assets = {}
+    missing = []
+    now = time.monotonic()
+    for url in dict.fromkeys(_ASSET_URL_RE.findall(template_html)):
+        local_path = _asset_path(url)
+        if local_path.exists():
+            assets[url] = str(local_path)
+        elif now - _FAILED_ASSETS.get(url, float("-inf")) >= _ASSET_RETRY_INTERVAL:
+            missing.append(url)
+    
+    if missing:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(missing), 8)) as executor:
+            futures = {url: executor.submit(_fetch_asset, url) for url in missing}
+            for url, future in futures.items():
+                try:
+                    assets[url] = future.result()
+                    _FAILED_ASSETS.pop(url, None)
+                except Exception as e:
+                    _FAILED_ASSETS[url] = time.monotonic()
+                    print(f"⚠️ 资源预取失败，{_ASSET_RETRY_INTERVAL}秒内不再重试: {url} ({str(e)})")
+    return assets
+
+
+async def _route_assets(page, assets: Dict[str, str]) -> None:
+    """拦截page对已镜像资源的请求，从本地缓存返回（附带CORS头，字体可跨域加载）"""
+    if not assets:
+        return
+    
+    async def fulfill(route):
+        local_path = assets.get(route.request.url)
+        if local_path is None:
+            await route.continue_()
+            return
+        suffix = os.path.splitext(local_path)[1].lower()
+        content_type = _FONT_MIME_TYPES.get(suffix) or mimetypes.guess_type(local_path)[0]
+        await route.fulfill(path=local_path, content_type=content_type or "application/octet-stream",
+                            headers={"Access-Control-Allow-Origin": "*"})
+    
+    await page.route(lambda url: url in assets, fulfill)
+
+
+# 模板变量占位符{{variable}}（预编译，全模块共用）
+_PLACEHOLDER_RE = re.compile(r'\{\{([^{}]+)\}\}')
+
+@functools.lru_cache(maxsize=32)
+def _compile_template(html: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """预编译模板：按{{variable}}切分为(静态片段, 变量名)，同一模板只解析一次"""
+    parts = _PLACEHOLDER_RE.split(html)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_substituter(html: str) -> Callable[[Dict[str, Any]], str]:
+    """
+    为模板生成专用的替换函数：静态片段和变量名按下标引用，拼接表达式一次性展开，
+    每帧渲染只剩一次join（未提供的变量保持原样）
+    
+    生成的代码只包含下标，模板中的用户文本不会进入源码
+    """
+    chunks, names = _compile_template(html)
+    placeholders = tuple(f"{{{{{name}}}}}" for name in names)
+    items = ["_c[0]"]
+    for i in range(len(names)):
+        items.append(f"(_s(v[_n[{i}]]) if _n[{i}] in v else _p[{i}])")
+        items.append(f"_c[{i + 1}]")
+    source = f"def _substitute(v, _s=str, _c=_c, _n=_n, _p=_p):\n    return ''.join(({', '.join(items)},))\n"
+    namespace = {"_c": chunks, "_n": names, "_p": placeholders}
+    exec(compile(source, "<html-template>", "exec"), namespace)
+    return namespace["_substitute"]
+
+
+def _image_to_uint8(image, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    将单帧IMAGE（HWC，0-1浮点）转换为连续的RGB uint8数组
+    
+    out: 可复用的uint8缓冲区，形状匹配时直接写入，避免逐帧分配
+    """
+    if isinstance(image, torch.Tensor) and image.device.type != "cpu":
+        # GPU张量：在设备上一个内核完成缩放和转换，只把uint8数据拷回CPU
+        if image.shape[-1] == 1:
+            image = image.expand(*image.shape[:-1], 3)
+        elif image.shape[-1] == 4:
+            image = image[..., :3]
+        return image.mul(255.0).to(torch.uint8).cpu().numpy()
+    
+    image_np = image.numpy() if isinstance(image, torch.Tensor) else image
+    if image_np.shape[-1] == 1:  # 灰度图转RGB（广播视图，不复制数据）
+        image_np = np.broadcast_to(image_np, image_np.shape[:-1] + (3,))
+    elif image_np.shape[-1] == 4:  # RGBA转RGB
+        image_np = image_np[..., :3]
+    # 缩放和uint8转换在同一遍中写入目标缓冲区
+    if out is None or out.shape != image_np.shape:
+        out = np.empty(image_np.shape, dtype=np.uint8)
+    np.multiply(image_np, 255.0, out=out, casting='unsafe')
+    return out
+
+
+def _uint8_to_data_uri(image_u8: np.ndarray) -> str:
+    """将RGB uint8数组编码为BMP data URI（浏览器只解码一次，未压缩格式省去zlib编码开销）"""
+    buf = io.BytesIO()
+    Image.fromarray(image_u8).save(buf, format="BMP")
+    return "data:image/bmp;base64," + base64.b64encode(buf.getbuffer()).decode("ascii")
+
+
+def _file_to_data_uri(path: str) -> str:
+    """将本地图像文件内联为data URI，省去浏览器的file://加载；文件不可读时回退为file:// URL"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return f"file://{path}"
+    mime_type = mimetypes.guess_type(path)[0] or "image/png"
+    return f"data:{mime_type};base64," + base64.b64encode(data).decode("ascii")
+
+
+@functools.lru_cache(maxsize=None)
+def _get_decode_png() -> Optional[Callable[[torch.Tensor], torch.Tensor]]:
+    """
+    可选：torchvision存在时直接将截图PNG解码为张量，跳过PIL
+    
+    首次解码时才导入（不拖慢节点加载）；torch/torchvision版本不匹配时导入会抛RuntimeError，
+    因此捕获所有异常并回退到PIL，结果缓存
+    """
+    try:
+        from torchvision.io import decode_png, ImageReadMode
+    except Exception:
+        return None
+    return functools.partial(decode_png, mode=ImageReadMode.RGB)
+
+
+def _load_frame_tensor(png_bytes: bytes, out: Optional[torch.Tensor] = None) -> torch.Tensor:
+    """
+    将截图PNG字节解码为ComfyUI的IMAGE张量 [1, H, W, 3]（内存中完成，不读盘）
+    
+    out为预分配的 [H, W, 3] float32张量（如批次张量的切片）时直接写入其中并返回out
+    """
+    decode_png = _get_decode_png()
+    if decode_png is not None:
+        # CHW uint8 -> 预分配的HWC float32，copy_完成类型转换，缩放原地完成
+        image_hwc = decode_png(torch.frombuffer(bytearray(png_bytes), dtype=torch.uint8)).permute(1, 2, 0)
+        result = torch.empty((1, *image_hwc.shape), dtype=torch.float32) if out is None else out
+        frame = result[0] if out is None else out
+        frame.copy_(image_hwc).mul_(1.0 / 255.0)
+        return result
+    
+    rendered_image = Image.open(io.BytesIO(png_bytes))
+    if rendered_image.mode not in ("RGB", "RGBA"):
+        rendered_image = rendered_image.convert("RGB")
+    # Chromium截图通常为RGBA：直接取前3通道的跨步视图，省去convert的整图转换；
+    # uint8视图按float32缩放写入预分配张量，中间不产生float副本
+    image_view = np.asarray(rendered_image)[..., :3]
+    result = torch.empty((1, *image_view.shape), dtype=torch.float32) if out is None else out
+    frame = result[0] if out is None else out
+    np.multiply(image_view, np.float32(1.0 / 255.0), out=frame.numpy(), dtype=np.float32)
+    return result
+
+
+# 等待页面字体全部就绪，返回加载失败的字体族名
+_FONTS_READY_JS = """
+async () => {
+    await document.fonts.ready;
+    return Array.from(document.fonts, f => f.status === 'error' ? f.family : null).filter(Boolean);
+}
+"""
+
+
+async def _load_html_file(page, html_file: str) -> None:
+    """以file://加载HTML文件：等到load事件（图片、样式表已加载）后再等待字体就绪"""
+    await page.goto(Path(html_file).as_uri(), wait_until="load")
+    failed_fonts = await page.evaluate(_FONTS_READY_JS)
+    if failed_fonts:
+        print(f"⚠️ 字体加载失败，使用回退字体: {', '.join(dict.fromkeys(failed_fonts))}")
+
+
+async def _screenshot_html_file(html_file: str, width: int, height: int,
+                                flags: Tuple[str, ...], output_path: str,
+                                assets: Optional[Dict[str, str]] = None) -> bytes:
+    """加载HTML文件并按clip精确截图，截图同时写入output_path，返回PNG字节"""
+    async with _POOL.page(flags, width, height) as page:
+        await _route_assets(page, assets)
+        await _load_html_file(page, html_file)
+        return await page.screenshot(
+            path=output_path,
+            type="png",
+            omit_background=False,
+            clip={"x": 0, "y": 0, "width": width, "height": height}
+        )
+
+
+async def _render_many_async(write_frame: Callable[[int, str], None], count: int,
+                             width: int, height: int, flags: Tuple[str, ...], paths: List[str],
+                             assets: Optional[Dict[str, str]] = None) -> List[bytes]:
+    """
+    并行批量渲染：从浏览器池借出N个page（N由环境变量HTML_RENDER_PARALLEL控制，默认4），
+    每个page（独立context）从共享队列取帧，在同一page内依次导航到各帧HTML并截图，
+    省去逐帧创建context的开销，脚本和样式仍按完整的页面加载流程执行
+    
+    write_frame(index, path)负责把第index帧的HTML写入path：在线程池中执行，
+    导航前才写入、截图后立即删除，临时目录（/dev/shm）中同时最多只有N个帧页面
+    """
+    parallel = max(1, int(os.getenv("HTML_RENDER_PARALLEL", 4)))
+    clip = {"x": 0, "y": 0, "width": width, "height": height}
+    results: List[Optional[bytes]] = [None] * count
+    pending = iter(range(count))
+    loop = asyncio.get_running_loop()
+    
+    async def worker():
+        async with _POOL.page(flags, width, height) as page:
+            await _route_assets(page, assets)
+            for index in pending:
+                html_file = os.path.join(_get_temp_dir(), f"batch_{uuid.uuid4().hex}.html")
+                try:
+                    await loop.run_in_executor(None, write_frame, index, html_file)
+                    await _load_html_file(page, html_file)
+                    results[index] = await page.screenshot(path=paths[index], type="png", clip=clip)
+                finally:
+                    with contextlib.suppress(OSError):
+                        os.remove(html_file)
+    
+    # 超出浏览器池page上限的worker只会排队等待信号量，不额外启动
+    workers = min(parallel, _POOL._max_pages, count)
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+
+# HTMLFrameRenderer的默认模板（模块级常量，INPUT_TYPES每次调用直接引用同一对象）
+_DEFAULT_TEMPLATE = """<!DOCTYPE html>
 <html lang="zh-CN">
 <head>
     <meta charset="UTF-8">
@@ -338,14 +891,52 @@ class HTMLFrameRenderer:
         <p>{{text}}</p>
     </div>
 </body>
-</html>""",
+</html>"""
+
+
+class HTMLFrameRenderer:
+    """
+    ComfyUI节点：HTML模板渲染器（使用常驻Playwright浏览器截图）
+    
+    输入:
+        - image: 输入图像 (IMAGE类型)
+        - title: 标题文本 (STRING类型)
+        - text: 正文文本 (STRING类型)
+        - template_html: HTML模板内容 (STRING类型)
+        - ext_json: 扩展参数的JSON字符串 (STRING类型，可选)
+        - output_width: 输出宽度 (INT类型，默认1080)
+        - output_height: 输出高度 (INT类型，默认1920)
+        - fast_mode: 快速模式，禁用远程字体 (BOOLEAN类型，可选)
+        - chrome_flags: 追加的Chromium启动参数 (STRING类型，可选)
+    
+    输出:
+        - image: 渲染后的图像 (IMAGE类型)
+        - image_path: 图像保存路径 (STRING类型)
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE",),
+                "title": ("STRING", {
+                    "default": "默认标题",
+                    "multiline": False
+                }),
+                "text": ("STRING", {
+                    "default": "默认正文内容",
+                    "multiline": True
+                }),
+                "template_html": ("STRING", {
+                    "default": _DEFAULT_TEMPLATE,
                     "multiline": True
                 })
             },
             "optional": {
                 "ext_json": ("STRING", {
                     "default": "{}",
-                    "multiline": True
+                    "multiline": True,
+                    "tooltip": "扩展参数JSON；输入多帧图像时可用frames列表为每帧指定title/text"
                 }),
                 "output_width": ("INT", {
                     "default": 1080,
@@ -356,6 +947,15 @@ class HTMLFrameRenderer:
                     "default": 1920,
                     "min": 100,
                     "max": 4096
+                }),
+                "fast_mode": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "快速模式：禁用远程字体，使用系统字体渲染"
+                }),
+                "chrome_flags": ("STRING", {
+                    "default": "",
+                    "multiline": False,
+                    "tooltip": "追加的Chromium启动参数（空格分隔），例如 --use-gl=swiftshader"
                 })
             }
         }
@@ -364,89 +964,90 @@ class HTMLFrameRenderer:
     RETURN_NAMES = ("image", "image_path")
     FUNCTION = "render_frame"
     CATEGORY = "图像处理/渲染"
-    DESCRIPTION = "使用HTML模板渲染图像帧（包含Chromium截图截断修复）"
+    DESCRIPTION = "使用HTML模板渲染图像帧（常驻Playwright浏览器池，精确裁剪截图）"
+    
+    # 渲染结果LRU缓存：{内容哈希: (PNG字节, 图像路径)}，相同输入直接跳过Chromium渲染；
+    # 只保存压缩后的PNG并按总字节数限制，命中时解码为新张量（下游修改返回的张量不会污染缓存）
+    _FRAME_CACHE: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+    _FRAME_CACHE_MAX_BYTES = 256 * 1024 * 1024
+    _frame_cache_bytes = 0
+    
+    def __init__(self):
+        # 输入图像uint8缓冲区，连续帧分辨率相同时复用
+        self._u8_scratch = None
     
     def render_frame(self, image: torch.Tensor, title: str, text: str, 
                     template_html: str, ext_json: str = "{}", 
-                    output_width: int = 1080, output_height: int = 1920) -> Tuple[torch.Tensor, str]:
+                    output_width: int = 1080, output_height: int = 1920,
+                    fast_mode: bool = False, chrome_flags: str = "") -> Tuple[torch.Tensor, str]:
         """
-        渲染HTML模板到图像（包含Chromium截图截断修复）
+        渲染HTML模板到图像
         """
         try:
+            # 多帧输入：整批交给同一页面逐帧渲染
+            if len(image.shape) == 4 and image.shape[0] > 1:
+                return self._render_image_batch(image, title, text, template_html, ext_json,
+                                                output_width, output_height, fast_mode, chrome_flags)
+            
             # 处理输入图像
             if len(image.shape) == 4:  # 如果有批次维度
                 image = image[0]  # 取第一张
             
-            # 转换图像为RGB
-            image_np = image.numpy() if isinstance(image, torch.Tensor) else image
-            if image_np.shape[-1] == 1:  # 灰度图转RGB
-                image_np = np.repeat(image_np, 3, axis=-1)
-            elif image_np.shape[-1] == 4:  # RGBA转RGB
-                image_np = image_np[..., :3]
-            
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix="comfyui_html_render_")
-            
-            # 保存输入图像为临时文件
-            input_image_path = os.path.join(temp_dir, "input_image.png")
-            pil_image = Image.fromarray((image_np * 255).astype(np.uint8))
-            pil_image.save(input_image_path)
-            
-            # 保存HTML模板为临时文件
-            template_path = os.path.join(temp_dir, "template.html")
-            with open(template_path, "w", encoding="utf-8") as f:
-                f.write(template_html)
+            # 转换图像为RGB uint8（复用实例缓冲区）
+            image_u8 = self._u8_scratch = _image_to_uint8(image, out=self._u8_scratch)
+            
+            # 按全部输入内容计算缓存键，命中则直接返回
+            hasher = hashlib.blake2b(digest_size=16)
+            for part in (template_html, title, text, ext_json, f"{output_width}x{output_height}", str(fast_mode), chrome_flags):
+                hasher.update(part.encode("utf-8"))
+                hasher.update(b"\0")
+            hasher.update(image_u8.tobytes())
+            cache_key = hasher.hexdigest()
+            cached = self._FRAME_CACHE.get(cache_key)
+            if cached is not None:
+                self._FRAME_CACHE.move_to_end(cache_key)
+                print(f"♻️ 命中渲染缓存: {cached[1]}")
+                return (_load_frame_tensor(cached[0]), cached[1])
+            
+            # 输入图像直接编码为内存中的data URI，省去写盘和file://加载
+            image_data_uri = _uint8_to_data_uri(image_u8)
+            
+            # 远程字体/图片预取到本地镜像（渲染时拦截请求返回）
+            if fast_mode:
+                template_html = _apply_fast_mode(template_html)
+            assets = _localize_assets(template_html)
             
             # 解析扩展参数
-            try:
-                ext_params = json.loads(ext_json) if ext_json.strip() else {}
-            except json.JSONDecodeError:
-                print(f"警告: ext_json解析失败，使用空字典")
-                ext_params = {}
+            ext_params = _parse_ext_json(ext_json)
             
             # 添加尺寸参数到扩展参数中
             ext_params["width"] = output_width
             ext_params["height"] = output_height
             
-            # 创建HTMLFrameGenerator实例
+            # 创建HTMLFrameGenerator实例（模板字符串直接传入，不经过磁盘）
             generator = self._create_html_frame_generator(
-                template_path, 
+                template_html, 
                 output_width, 
-                output_height
+                output_height,
+                _chromium_flags(fast_mode, template_html, chrome_flags),
+                assets
             )
             
-            # 生成帧
-            output_image_path = generator.generate_frame(
+            # 生成帧：直接截图到最终输出路径，无需再解码/重新编码保存
+            output_saved_path = os.path.join(tempfile.gettempdir(), f"rendered_frame_{uuid.uuid4().hex[:8]}.png")
+            output_image_path, png_bytes = generator.generate_frame(
                 title=title,
                 text=text,
-                image=input_image_path,
+                image=image_data_uri,
                 ext=ext_params,
-                output_path=os.path.join(temp_dir, "output_frame.png")
+                output_path=output_saved_path
             )
             
-            # 加载渲染后的图像
-            rendered_image = Image.open(output_image_path)
-            
-            # 转换回ComfyUI的IMAGE格式 (转换为RGB)
-            if rendered_image.mode != "RGB":
-                rendered_image = rendered_image.convert("RGB")
-            
-            # 转换为numpy数组
-            image_array = np.array(rendered_image).astype(np.float32) / 255.0
-            
-            # 转换为torch张量并添加批次维度
-            image_tensor = torch.from_numpy(image_array)[None, ...]
-            
-            # 保存最终输出文件
-            output_saved_path = os.path.join(os.path.dirname(temp_dir), f"rendered_frame_{uuid.uuid4().hex[:8]}.png")
-            rendered_image.save(output_saved_path)
-            
-            # 清理临时目录
-            import shutil
-            try:
-                shutil.rmtree(temp_dir)
-            except:
-                pass
+            # 加载渲染后的图像，转换回ComfyUI的IMAGE格式
+            image_tensor = _load_frame_tensor(png_bytes)
+                
+            # 写入渲染缓存
+            self._cache_frame(cache_key, png_bytes, output_saved_path)
                 
             print(f"✅ 渲染完成，图像已保存到: {output_saved_path}")
             return (image_tensor, output_saved_path)
@@ -455,57 +1056,130 @@ class HTMLFrameRenderer:
             print(f"❌ 渲染失败: {str(e)}")
             traceback.print_exc()
             # 返回原始图像作为降级处理
-            return (image[None, ...] if len(image.shape) == 3 else image, "")
+            return (image.unsqueeze(0) if image.dim() == 3 else image, "")
+    
+    @classmethod
+    def _cache_frame(cls, cache_key: str, png_bytes: bytes, path: str) -> None:
+        """写入渲染缓存，总字节数超出上限时淘汰最久未使用的条目"""
+        cls._FRAME_CACHE[cache_key] = (png_bytes, path)
+        cls._frame_cache_bytes += len(png_bytes)
+        while cls._frame_cache_bytes > cls._FRAME_CACHE_MAX_BYTES and len(cls._FRAME_CACHE) > 1:
+            evicted_png, _ = cls._FRAME_CACHE.popitem(last=False)[1]
+            cls._frame_cache_bytes -= len(evicted_png)
+    
+    def _render_image_batch(self, images: torch.Tensor, title: str, text: str,
+                            template_html: str, ext_json: str, output_width: int,
+                            output_height: int, fast_mode: bool,
+                            chrome_flags: str = "") -> Tuple[torch.Tensor, str]:
+        """
+        渲染IMAGE批次 [N, H, W, C]，返回 [N, H, W, 3] 张量和换行分隔的图像路径
+        
+        ext_json中的frames列表（如 [{"title": "...", "text": "..."}, ...]）可覆盖对应帧的title/text
+        """
+        ext_params = _parse_ext_json(ext_json)
+        per_frame = ext_params.pop("frames", None)
+        if not isinstance(per_frame, list):
+            per_frame = []
+        
+        frames = []
+        for i in range(images.shape[0]):
+            overrides = per_frame[i] if i < len(per_frame) and isinstance(per_frame[i], dict) else {}
+            frames.append((images[i], str(overrides.get("title", title)), str(overrides.get("text", text))))
+        
+        image_tensor, paths = self._render_batch(
+            frames, template_html, output_width, output_height,
+            ext_params, fast_mode, chrome_flags
+        )
+        return (image_tensor, "\n".join(paths))
+    
+    @classmethod
+    def render_batch(cls, frames: List[Tuple[torch.Tensor, str, str]], template_html: str,
+                     output_width: int = 1080, output_height: int = 1920,
+                     ext_json: str = "{}", fast_mode: bool = False,
+                     chrome_flags: str = "") -> Tuple[torch.Tensor, List[str]]:
+        """
+        批量渲染多帧：每帧按render_frame相同的方式代入{{variable}}，多个page并行，
+        每个page复用同一context依次导航到各帧HTML并截图（远程资源由本地镜像提供，只下载一次）
+        
+        每帧都是完整的页面加载，模板中的脚本（如按文字长度调整字号）和<style>内的
+        {{variable}}（如url("{{image}}")背景图）与单帧渲染结果一致
+        
+        参数:
+            - frames: [(image, title, text), ...]
+        返回:
+            - (IMAGE张量 [N, H, W, 3], 各帧图像路径列表)
+        """
+        return cls._render_batch(frames, template_html, output_width, output_height,
+                                 _parse_ext_json(ext_json), fast_mode, chrome_flags)
+    
+    @classmethod
+    def _render_batch(cls, frames: List[Tuple[torch.Tensor, str, str]], template_html: str,
+                      output_width: int, output_height: int, ext_params: Dict[str, Any],
+                      fast_mode: bool, chrome_flags: str) -> Tuple[torch.Tensor, List[str]]:
+        """render_batch的实现，扩展参数直接以字典传入"""
+        if not frames:
+            raise ValueError("frames不能为空")
+        
+        ext_params = dict(ext_params, width=output_width, height=output_height)
+        
+        # 远程资源预取到本地镜像（渲染时拦截请求返回）
+        if fast_mode:
+            template_html = _apply_fast_mode(template_html)
+        assets = _localize_assets(template_html)
+        substitute = _compile_substituter(template_html)
+        
+        def write_frame(index: int, html_file: str) -> None:
+            """代入第index帧的变量（输入图像编码为data URI）并写入html_file"""
+            image, title, text = frames[index]
+            if len(image.shape) == 4:
+                image = image[0]
+            _write_html(html_file, substitute(dict(ext_params, title=title, text=text,
+                                                   image=_uint8_to_data_uri(_image_to_uint8(image)))))
+        
+        paths = [os.path.join(tempfile.gettempdir(), f"rendered_frame_{uuid.uuid4().hex[:8]}.png")
+                 for _ in frames]
+        
+        # 多个page并行渲染，各帧HTML在渲染前才生成
+        results = _run_coro(_render_many_async(
+            write_frame, len(frames), output_width, output_height,
+            _chromium_flags(fast_mode, template_html, chrome_flags), paths, assets
+        ))
+        
+        # 各帧直接解码到预分配的批次张量切片中，不再拼接
+        image_tensor = torch.empty((len(results), output_height, output_width, 3), dtype=torch.float32)
+        for frame, png_bytes in zip(image_tensor, results):
+            _load_frame_tensor(png_bytes, out=frame)
+        
+        print(f"✅ 批量渲染完成: {len(paths)}帧")
+        return (image_tensor, paths)
     
-    def _create_html_frame_generator(self, template_path: str, width: int, height: int):
-        """创建包含Chromium截图截断修复的HTMLFrameGenerator"""
+    def _create_html_frame_generator(self, template_html: str, width: int, height: int,
+                                     flags: Tuple[str, ...] = _chromium_flags(),
+                                     assets: Optional[Dict[str, str]] = None):
+        """创建基于常驻Playwright浏览器的HTMLFrameGenerator"""
         
         class FixedHTMLFrameGenerator:
-            def __init__(self, template_path: str, width: int, height: int):
-                self.template_path = template_path
+            def __init__(self, template_html: str, width: int, height: int):
                 self.width = width
                 self.height = height
-                self.template = self._load_template(template_path)
-                self.hti = None
-                
-            def _load_template(self, template_path: str) -> str:
-                with open(template_path, 'r', encoding='utf-8') as f:
-                    return f.read()
+                self.flags = flags
+                self.assets = assets
+                self.template = template_html
             
             def _replace_parameters(self, html: str, values: Dict[str, Any]) -> str:
-                # 替换所有{{variable}}格式的变量
-                for key, value in values.items():
-                    placeholder = f"{{{{{key}}}}}"
-                    html = html.replace(placeholder, str(value))
-                return html
-            
-            def _ensure_hti(self, render_width: int, render_height: int):
-                if self.hti is None:
-                    # 配置Chrome flags
-                    custom_flags = [
-                        '--no-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-gpu',
-                        '--hide-scrollbars',
-                        '--mute-audio',
-                        '--disable-background-networking',
-                        '--disable-features=TranslateUI',
-                    ]
-                    
-                    self.hti = Html2Image(
-                        size=(render_width, render_height),
-                        custom_flags=custom_flags
-                    )
+                # 替换所有{{variable}}格式的变量（未提供的变量保持原样）
+                return _compile_substituter(html)(values)
             
             def generate_frame(self, title: str, text: str, image: str, 
                              ext: Optional[Dict[str, Any]] = None, 
-                             output_path: Optional[str] = None) -> str:
+                             output_path: Optional[str] = None) -> Tuple[str, bytes]:
+                """渲染一帧，返回(图像路径, PNG字节)"""
                 
                 # 构建变量上下文
                 context = {
                     "title": title,
                     "text": text,
-                    "image": f"file://{image}" if image and not image.startswith(('http://', 'https://', 'file://')) else image,
+                    "image": _file_to_data_uri(image) if image and not image.startswith(('http://', 'https://', 'file://', 'data:')) else image,
                 }
                 
                 # 添加扩展参数
@@ -516,7 +1190,6 @@ class HTMLFrameRenderer:
                 html = self._replace_parameters(self.template, context)
                 
                 # 设置输出路径
-                import os
                 if output_path is None:
                     output_dir = os.path.join(os.path.expanduser("~"), "comfyui_output")
                     os.makedirs(output_dir, exist_ok=True)
@@ -525,84 +1198,115 @@ class HTMLFrameRenderer:
                 else:
                     os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 
-                # 关键修复：渲染时增加高度以补偿Chromium截图截断问题
-                render_height = self.height + HTMLFrameRenderer.CHROMIUM_HEIGHT_OFFSET
+                # 渲染HTML到图像：写入进程临时目录中的HTML文件后以file://加载，保证本地资源可访问
+                # （文件名唯一，并发渲染互不冲突，也不会在输出目录留下中间文件）
+                html_file = os.path.join(_get_temp_dir(), f"page_{uuid.uuid4().hex}.html")
+                _write_html(html_file, html)
                 
-                # 确保Html2Image初始化（使用增加后的高度）
-                self._ensure_hti(self.width, render_height)
-                
-                # 渲染HTML到图像
                 try:
-                    # 先渲染到临时文件
-                    temp_filename = f"temp_{uuid.uuid4().hex[:8]}.png"
-                    self.hti.screenshot(
-                        html_str=html,
-                        save_as=temp_filename
-                    )
+                    png_bytes = _run_coro(_screenshot_html_file(
+                        html_file, self.width, self.height, self.flags, output_path, self.assets
+                    ))
                     
-                    # 获取临时文件路径
-                    temp_output = os.path.join(os.getcwd(), temp_filename)
-                    
-                    if os.path.exists(temp_output):
-                        # 关键修复：裁剪图像以移除额外的高度补偿
-                        with Image.open(temp_output) as img:
-                            # 裁剪到原始尺寸 (0, 0, width, height)
-                            cropped_img = img.crop((0, 0, self.width, self.height))
-                            cropped_img.save(output_path)
-                        
-                        # 清理临时文件
-                        os.remove(temp_output)
-                        
-                        print(f"✅ 图像已渲染并裁剪，保存到: {output_path}")
-                        return output_path
-                    else:
-                        raise Exception("临时渲染文件未生成")
+                    print(f"✅ 图像已渲染，保存到: {output_path}")
+                    return output_path, png_bytes
                     
                 except Exception as e:
                     print(f"❌ HTML渲染错误: {str(e)}")
                     raise
+                finally:
+                    if os.path.exists(html_file):
+                        os.remove(html_file)
         
-        return FixedHTMLFrameGenerator(template_path, width, height)
+        return FixedHTMLFrameGenerator(template_html, width, height)
 
-import torch
-import os
-import json
-import tempfile
-import traceback
-import asyncio
-import threading
-import numpy as np
-from PIL import Image
-import io
-import base64
-from pathlib import Path
-from typing import Dict, Any, Optional, Tuple, List
-import uuid
-import time
-from playwright.async_api import async_playwright
 
-class HTMLVideoRecorderPlaywright:
-    """
-    ComfyUI节点：使用Playwright进行HTML视频录制
-    """
-    
-    @classmethod
-    def INPUT_TYPES(cls):
-        return {
-            "required": {
-                "image": ("IMAGE", {
-                    "tooltip": "输入图像，将进行圆形剪裁并旋转显示"
-                }),
-                "title": ("STRING", {
-                    "default": "动态视频标题",
-                    "multiline": False
-                }),
-                "text": ("STRING", {
-                    "default": "这是一个带动态效果的视频示例，文本将进行滚动显示",
-                    "multiline": True
-                }),
-                "template_html": ("STRING", {
-                    "default": """<!DOCTYPE html>
+async def _run_ffmpeg(cmd: List[str]) -> Tuple[int, str]:
+    """异步运行ffmpeg，边读边丢弃stderr，只保留最后4KB用于诊断，返回(退出码, stderr末尾)"""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+    tail = b""
+    while True:
+        chunk = await proc.stderr.read(65536)
+        if not chunk:
+            break
+        tail = (tail + chunk)[-4096:]
+    await proc.wait()
+    return proc.returncode, tail.decode(errors="replace")
+
+
+# 视频录制使用的Chromium启动参数（与帧渲染分开缓存浏览器）
+_VIDEO_CHROMIUM_FLAGS = (
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--hide-scrollbars',
+    '--disable-web-security',  # 允许跨域资源加载
+)
+
+# 录制计时脚本：每帧累加window.__frame，达到指定时长（毫秒）后设置window.__done
+_RECORD_TIMER_JS = """
+(duration) => {
+    const start = performance.now();
+    const tick = (now) => {
+        window.__frame = (window.__frame || 0) + 1;
+        if (now - start >= duration) window.__done = true;
+        else if (window.__done !== true) requestAnimationFrame(tick);
+    };
+    requestAnimationFrame(tick);
+}
+"""
+
+# 模板已用CSS把{{image_url}}图片裁成圆形时（该<img>自身的规则含border-radius: 50%），
+# 头像无需透明通道，可直接用JPEG
+_CSS_CIRCLE_CLIP_RE = re.compile(r'border-radius\s*:\s*50%')
+_IMAGE_URL_TAG_RE = re.compile(r'<img\b[^>]*\{\{image_url\}\}[^>]*>', re.IGNORECASE)
+_TAG_SELECTOR_ATTR_RE = re.compile(r'\b(class|id)\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+_CSS_RULE_RE = re.compile(r'([^{}]+)\{([^{}]*)\}')
+
+
+def _template_clips_image(template_html: str) -> bool:
+    """判断模板是否用CSS把{{image_url}}的<img>裁成圆形（按其class/id匹配规则，只看选择器的最后一段）"""
+    tag = _IMAGE_URL_TAG_RE.search(template_html)
+    if tag is None:
+        return False
+    selectors = set()
+    for attr, value in _TAG_SELECTOR_ATTR_RE.findall(tag.group(0)):
+        prefix = "." if attr.lower() == "class" else "#"
+        selectors.update(prefix + token for token in value.split())
+    for selector_text, body in _CSS_RULE_RE.findall(template_html):
+        if not _CSS_CIRCLE_CLIP_RE.search(body):
+            continue
+        for selector in selector_text.split(","):
+            target = re.split(r'[\s>+~]+', selector.strip())[-1]
+            if selectors.intersection(re.findall(r'[.#][\w-]+', target)):
+                return True
+    return False
+
+# 视频模板的动画速度控制（str.format参数：各动画时长和自定义动画数据）
+# 时长以CSS变量注入，并直接覆盖对应元素的animation-duration，无需脚本读取、正则改写样式
+_VIDEO_ANIMATION_SCRIPT = """
+        <style>
+            :root {{
+                --rot-dur: {rotation_duration}s;
+                --title-dur: {title_duration}s;
+                --scroll-dur: {scroll_duration}s;
+            }}
+            .circular-image {{ animation-duration: var(--rot-dur); }}
+            .scaling-title {{ animation-duration: var(--title-dur); }}
+            .scrolling-text {{ animation-duration: var(--scroll-dur); }}
+        </style>
+        <script>
+            // 添加额外的动画数据
+            window.customAnimationData = {anim_data};
+        </script>
+        """
+
+# HTMLVideoRecorderPlaywright的默认模板
+_DEFAULT_VIDEO_TEMPLATE = """<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -678,7 +1382,7 @@ class HTMLVideoRecorderPlaywright:
             object-fit: cover;
             border: 8px solid rgba(255, 255, 255, 0.3);
             box-shadow: 0 10px 30px rgba(0, 0, 0, 0.3);
-            animation: rotate 20s linear infinite;
+            animation: rotate var(--rot-dur, 20s) linear infinite;
         }
 
         @keyframes rotate {
@@ -697,7 +1401,7 @@ class HTMLVideoRecorderPlaywright:
             font-weight: bold;
             color: #ffffff;
             text-shadow: 0 4px 8px rgba(0, 0, 0, 0.3);
-            animation: scalePulse 3s ease-in-out infinite;
+            animation: scalePulse var(--title-dur, 3s) ease-in-out infinite;
             display: inline-block;
         }
 
@@ -732,7 +1436,7 @@ class HTMLVideoRecorderPlaywright:
             left: 0;
             width: 100%;
             padding: 25px;
-            animation: scrollText 20s linear infinite;
+            animation: scrollText var(--scroll-dur, 20s) linear infinite;
         }
 
         @keyframes scrollText {
@@ -844,7 +1548,31 @@ class HTMLVideoRecorderPlaywright:
         <p>视频录制时间: {{current_time}} | 帧率: {{fps}}fps | 时长: {{duration}}秒</p>
     </div>
 </body>
-</html>""",
+</html>"""
+
+
+class HTMLVideoRecorderPlaywright:
+    """
+    ComfyUI节点：使用Playwright进行HTML视频录制
+    """
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "image": ("IMAGE", {
+                    "tooltip": "输入图像，将进行圆形剪裁并旋转显示"
+                }),
+                "title": ("STRING", {
+                    "default": "动态视频标题",
+                    "multiline": False
+                }),
+                "text": ("STRING", {
+                    "default": "这是一个带动态效果的视频示例，文本将进行滚动显示",
+                    "multiline": True
+                }),
+                "template_html": ("STRING", {
+                    "default": _DEFAULT_VIDEO_TEMPLATE,
                     "multiline": True
                 }),
                 "duration_seconds": ("FLOAT", {
@@ -923,6 +1651,10 @@ class HTMLVideoRecorderPlaywright:
     CATEGORY = "视频处理/录制"
     DESCRIPTION = "使用Playwright录制HTML动态效果视频，支持图像圆形剪裁旋转、标题缩放、文本滚动"
     
+    # 350x350圆形头像的alpha遮罩（只计算一次）
+    _CIRCLE_ALPHA = (((np.arange(350) - 174.5)[:, None] ** 2
+                      + (np.arange(350) - 174.5)[None, :] ** 2) <= 174.5 ** 2).astype(np.uint8) * 255
+    
     def record_video(self, image: torch.Tensor, title: str, text: str, template_html: str,
                     duration_seconds: float, fps: int,
                     output_width: int, output_height: int,
@@ -936,27 +1668,31 @@ class HTMLVideoRecorderPlaywright:
         使用Playwright录制HTML视频
         """
         try:
+            # 浏览器在后台事件循环上预热，与下面的图像处理（PIL/CPU）和HTML构建并行
+            warm_up = asyncio.run_coroutine_threadsafe(_warm_up_browser(_VIDEO_CHROMIUM_FLAGS), _get_loop())
+            
             # 创建临时目录
             temp_dir = tempfile.mkdtemp(prefix="comfyui_video_recorder_")
             
             # 处理输入图像：转换为圆形剪裁的Base64编码
             print("🖼️ 处理输入图像...")
-            image_base64 = self._process_image_to_circle(image)
+            image_base64 = self._process_image_to_circle(
+                image, css_clip=_template_clips_image(template_html)
+            )
             
             # 解析扩展参数
             try:
-                ext_params = json.loads(ext_json) if ext_json.strip() else {}
-            except:
+                ext_params = _loads_json(ext_json)
+            except json.JSONDecodeError:
                 ext_params = {}
             
             # 解析动画数据
             try:
-                anim_data = json.loads(animation_data) if animation_data.strip() else {}
-            except:
+                anim_data = _loads_json(animation_data)
+            except json.JSONDecodeError:
                 anim_data = {}
             
             # 获取当前时间
-            from datetime import datetime
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             # 构建HTML内容
@@ -969,57 +1705,11 @@ class HTMLVideoRecorderPlaywright:
             
             # 保存HTML文件
             html_path = os.path.join(temp_dir, "content.html")
-            with open(html_path, "w", encoding="utf-8") as f:
-                f.write(html_content)
-            
-            # 修复：使用线程运行异步代码
-            video_result = [None]  # 用于存储结果视频文件路径
-            error_result = [None]  # 用于存储错误
-            
-            def run_async():
-                try:
-                    # 创建新的事件循环
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    result = loop.run_until_complete(self._record_with_playwright(
-                        html_path=html_path,
-                        temp_dir=temp_dir,
-                        duration=duration_seconds,
-                        width=output_width,
-                        height=output_height
-                    ))
-                    video_result[0] = result
-                    loop.close()
-                except Exception as e:
-                    error_result[0] = e
-            
-            # 在新线程中运行异步代码
-            print("🎬 开始录制视频...")
-            thread = threading.Thread(target=run_async)
-            thread.start()
-            thread.join()  # 等待线程完成
-            
-            # 检查是否有错误
-            if error_result[0]:
-                raise error_result[0]
+            _write_html(html_path, html_content)
+            warm_up.result()
             
-            # 获取生成的视频文件路径
-            video_path = video_result[0]
-            
-            if not video_path or not os.path.exists(video_path):
-                # 如果没有找到视频文件，尝试在临时目录中查找.webm文件
-                webm_files = [f for f in os.listdir(temp_dir) if f.endswith('.webm')]
-                if webm_files:
-                    video_path = os.path.join(temp_dir, webm_files[0])
-                    print(f"✅ 找到视频文件: {video_path}")
-                else:
-                    raise FileNotFoundError(f"未找到视频文件在目录: {temp_dir}")
-            
-            # 转换为MP4格式
+            # 保存到输出文件夹时，先确定最终路径，由ffmpeg直接写入（省去一次整文件复制）
             mp4_path = os.path.join(temp_dir, "output.mp4")
-            self._convert_to_mp4(video_path, mp4_path, fps)
-            
-            # 如果启用保存到输出文件夹
             final_video_path = mp4_path
             if save_to_output:
                 try:
@@ -1031,16 +1721,43 @@ class HTMLVideoRecorderPlaywright:
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     safe_filename = f"{output_filename}_{timestamp}.mp4"
                     final_video_path = os.path.join(output_dir, safe_filename)
-                    
-                    # 复制视频文件到输出目录
-                    import shutil
-                    shutil.copy2(mp4_path, final_video_path)
-                    
-                    print(f"💾 视频已保存到输出文件夹: {final_video_path}")
                 except Exception as e:
                     print(f"⚠️ 无法保存到输出文件夹: {str(e)}")
                     print(f"📁 视频保存在临时位置: {mp4_path}")
             
+            # 在常驻的后台事件循环上录制（不再为每次调用新建线程和事件循环）
+            print("🎬 开始录制视频...")
+            recorded = False
+            if shutil.which("ffmpeg"):
+                # 优先用CDP录屏将帧直接送入ffmpeg编码，省去webm中间文件和二次编码
+                try:
+                    _run_coro(self._record_with_screencast(
+                        html_path=html_path,
+                        output_path=final_video_path,
+                        duration=duration_seconds,
+                        fps=fps,
+                        width=output_width,
+                        height=output_height
+                    ))
+                    recorded = True
+                except Exception as e:
+                    print(f"⚠️ CDP录屏失败，改用Playwright录像: {str(e)}")
+            
+            if not recorded:
+                video_path = _run_coro(self._record_with_playwright(
+                    html_path=html_path,
+                    temp_dir=temp_dir,
+                    duration=duration_seconds,
+                    width=output_width,
+                    height=output_height
+                ))
+                
+                # 转换为MP4格式（转换失败时返回实际保存的webm路径）
+                final_video_path = _run_coro(self._convert_to_mp4(video_path, final_video_path, fps))
+            
+            if final_video_path != mp4_path:
+                print(f"💾 视频已保存到: {final_video_path}")
+            
             # 计算帧数
             frames_count = int(duration_seconds * fps)
             
@@ -1059,7 +1776,7 @@ class HTMLVideoRecorderPlaywright:
                 "title_scale_speed": title_scale_speed,
                 "text_scroll_speed": text_scroll_speed
             }
-            video_info_json = json.dumps(video_info, ensure_ascii=False, indent=2)
+            video_info_json = _dumps_json(video_info)
             
             print(f"✅ 视频录制完成: {final_video_path}")
             print(f"📊 视频信息: {frames_count}帧, {fps}fps, {duration_seconds}秒")
@@ -1069,76 +1786,65 @@ class HTMLVideoRecorderPlaywright:
         except Exception as e:
             print(f"❌ 视频录制失败: {str(e)}")
             traceback.print_exc()
-            return ("", 0, json.dumps({"error": str(e)}))
+            return ("", 0, _dumps_json({"error": str(e)}))
     
-    def _process_image_to_circle(self, image_tensor: torch.Tensor) -> str:
-        """将输入的图像张量转换为圆形剪裁的Base64编码"""
+    def _process_image_to_circle(self, image_tensor: torch.Tensor, css_clip: bool = False) -> str:
+        """
+        将输入的图像张量转换为圆形剪裁的Base64编码
+        
+        css_clip为True时模板已用CSS裁圆，输出白底JPEG，体积远小于带透明通道的PNG
+        """
         try:
             # 确保图像张量的维度正确
             if len(image_tensor.shape) == 4:  # [B, H, W, C]
                 # 取第一张图像
                 image_tensor = image_tensor[0]
             
-            # 转换为PIL图像
-            image_np = image_tensor.cpu().numpy()
-            
-            # 确保值在0-1范围内
-            if image_np.max() > 1.0:
-                image_np = image_np / 255.0
+            # 单通道转RGB：expand只是视图，不复制数据
+            if image_tensor.dim() == 2:
+                image_tensor = image_tensor.unsqueeze(-1)
+            if image_tensor.shape[2] == 1:
+                image_tensor = image_tensor.expand(-1, -1, 3)
             
-            # 转换为0-255的uint8
-            image_np = (image_np * 255).astype(np.uint8)
+            # 转换为uint8：uint8输入直接使用；浮点输入在所在设备上一次完成缩放和转换，只拷回uint8数据
+            if image_tensor.dtype == torch.uint8:
+                image_np = image_tensor.cpu().numpy()
+            else:
+                image_np = image_tensor.clamp(0, 1).mul(255).to(torch.uint8).cpu().numpy()
             
             # 转换为PIL图像
             if image_np.shape[2] == 4:  # RGBA
                 image_pil = Image.fromarray(image_np, 'RGBA')
-            elif image_np.shape[2] == 3:  # RGB
-                image_pil = Image.fromarray(image_np, 'RGB')
-            else:
-                # 如果是单通道，转换为RGB
-                if len(image_np.shape) == 2:
-                    image_np = np.stack([image_np] * 3, axis=-1)
+            else:  # RGB
                 image_pil = Image.fromarray(image_np, 'RGB')
             
-            # 确保图像是正方形，进行中心剪裁
+            # 中心正方形区域直接作为resize的源矩形，缩放到350x350（与CSS中的尺寸匹配），省去crop拷贝
             width, height = image_pil.size
             min_dim = min(width, height)
             left = (width - min_dim) // 2
             top = (height - min_dim) // 2
-            right = left + min_dim
-            bottom = top + min_dim
-            image_pil = image_pil.crop((left, top, right, bottom))
-            
-            # 调整大小到350x350（与CSS中的尺寸匹配）
-            image_pil = image_pil.resize((350, 350), Image.Resampling.LANCZOS)
-            
-            # 创建圆形遮罩
-            mask = Image.new('L', (350, 350), 0)
-            mask_draw = Image.new('L', (350, 350), 0)
-            draw = Image.new('RGBA', (350, 350), (0, 0, 0, 0))
-            
-            # 创建圆形遮罩
-            from PIL import ImageDraw
-            draw_mask = ImageDraw.Draw(mask)
-            draw_mask.ellipse([(0, 0), (350, 350)], fill=255)
-            
-            # 应用圆形遮罩
-            if image_pil.mode == 'RGBA':
-                # 如果图像有alpha通道，我们需要合并
-                image_rgba = image_pil
-            else:
-                # 转换为RGBA
-                image_rgba = image_pil.convert('RGBA')
-            
-            # 应用圆形剪裁
-            circular_image = Image.new('RGBA', (350, 350), (0, 0, 0, 0))
-            circular_image.paste(image_rgba, (0, 0), mask)
+            image_pil = image_pil.resize((350, 350), Image.Resampling.LANCZOS,
+                                         box=(left, top, left + min_dim, top + min_dim))
+            
+            if css_clip:
+                if image_pil.mode == 'RGBA':
+                    background = Image.new('RGB', image_pil.size, (255, 255, 255))
+                    background.paste(image_pil, mask=image_pil.getchannel('A'))
+                    image_pil = background
+                buffered = io.BytesIO()
+                image_pil.save(buffered, format="JPEG", quality=85, optimize=False)
+                return "data:image/jpeg;base64," + base64.b64encode(buffered.getbuffer()).decode("ascii")
+            
+            # 应用圆形剪裁：预计算的圆形alpha直接写入RGBA数组（原有alpha与圆形取交集）
+            image_rgba = np.array(image_pil.convert('RGBA'))
+            np.minimum(image_rgba[..., 3], self._CIRCLE_ALPHA, out=image_rgba[..., 3])
+            circular_image = Image.fromarray(image_rgba, 'RGBA')
             
             # 添加白色边框（可选，已在CSS中处理）
             # 转换为Base64
             buffered = io.BytesIO()
             circular_image.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
+            img_str = base64.b64encode(buffered.getbuffer()).decode("ascii")
             
             return f"data:image/png;base64,{img_str}"
             
@@ -1153,74 +1859,119 @@ class HTMLVideoRecorderPlaywright:
                            rotation_speed: float, scale_speed: float, scroll_speed: float,
                            ext_params: Dict, anim_data: Dict) -> str:
         """构建HTML内容"""
-        # 替换模板变量
-        html = template
-        html = html.replace("{{title}}", title)
-        html = html.replace("{{text}}", text)
-        html = html.replace("{{duration}}", str(duration))
-        html = html.replace("{{fps}}", str(fps))
-        html = html.replace("{{current_time}}", current_time)
-        html = html.replace("{{image_url}}", image_base64)
+        # 替换模板变量：预编译的替换函数一次完成（基础变量优先于同名扩展参数）
+        values = dict(ext_params)
+        values.update(
+            title=title,
+            text=text,
+            duration=duration,
+            fps=fps,
+            current_time=current_time,
+            image_url=image_base64,
+        )
+        html = _compile_substituter(template)(values)
         
-        # 添加扩展参数
-        for key, value in ext_params.items():
-            placeholder = f"{{{{{key}}}}}"
-            html = html.replace(placeholder, str(value))
+        # 添加动画速度控制样式和脚本（JSON中的"</"转义，避免提前结束script标签）
+        animation_script = _VIDEO_ANIMATION_SCRIPT.format(
+            rotation_duration=20 / rotation_speed,
+            title_duration=3 / scale_speed,
+            scroll_duration=20 / scroll_speed,
+            anim_data=_dumps_json(anim_data).replace("</", "<\\/"),
+        )
+        html = html.replace("</body>", f"{animation_script}</body>")
         
-        # 添加动画速度控制脚本
-        animation_script = f"""
-        <script>
-            // 动画速度控制
-            document.addEventListener('DOMContentLoaded', function() {{
-                // 调整图像旋转速度
-                const imageElement = document.querySelector('.circular-image');
-                if (imageElement) {{
-                    const currentAnimation = getComputedStyle(imageElement).animation;
-                    const newAnimation = currentAnimation.replace(/\\d+s/, '{20/rotation_speed}s');
-                    imageElement.style.animation = newAnimation;
-                }}
+        return html
+    
+    async def _record_with_screencast(self, html_path: str, output_path: str,
+                                      duration: float, fps: int, width: int, height: int):
+        """
+        通过CDP录屏（Page.startScreencast）将JPEG帧直接写入ffmpeg编码为MP4
+        
+        按目标帧率写入最新一帧（画面未变化时重复上一帧），输出帧数和时长与参数一致
+        """
+        browser = await _POOL.get_browser(_VIDEO_CHROMIUM_FLAGS)
+        proc = None
+        try:
+            context = await browser.new_context(
+                viewport={'width': width, 'height': height},
+                ignore_https_errors=True  # 忽略HTTPS错误
+            )
+            try:
+                page = await context.new_page()
+                await page.goto(f"file://{html_path}")
                 
-                // 调整标题缩放速度
-                const titleElement = document.querySelector('.scaling-title');
-                if (titleElement) {{
-                    const currentAnimation = getComputedStyle(titleElement).animation;
-                    const newAnimation = currentAnimation.replace(/\\d+s/, '{3/scale_speed}s');
-                    titleElement.style.animation = newAnimation;
-                }}
+                # 等待页面加载完成和字体加载
+                await page.wait_for_load_state('networkidle')
+                await page.wait_for_timeout(1000)  # 额外等待1秒确保所有资源加载
                 
-                // 调整文本滚动速度
-                const textElement = document.querySelector('.scrolling-text');
-                if (textElement) {{
-                    const currentAnimation = getComputedStyle(textElement).animation;
-                    const newAnimation = currentAnimation.replace(/\\d+s/, '{20/scroll_speed}s');
-                    textElement.style.animation = newAnimation;
-                }}
+                proc = await asyncio.create_subprocess_exec(
+                    'ffmpeg', '-y', '-loglevel', 'error', '-nostats',
+                    '-f', 'image2pipe', '-c:v', 'mjpeg', '-framerate', str(fps), '-i', '-',
+                    '-c:v', 'libx264', '-preset', 'ultrafast', '-threads', '0',
+                    '-pix_fmt', 'yuv420p', '-an', '-movflags', '+faststart',
+                    output_path,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
                 
-                // 添加额外的动画数据
-                {json.dumps(anim_data) if anim_data else 'window.customAnimationData = {};'}
-            }});
-        </script>
-        """
-        html = html.replace("</body>", f"{animation_script}</body>")
+                # 录屏帧只保留最新一帧，收到后立即确认以便浏览器继续推送
+                latest = [None]
+                first_frame = asyncio.Event()
+                cdp = await context.new_cdp_session(page)
+                
+                def on_frame(params):
+                    latest[0] = params["data"]
+                    first_frame.set()
+                    asyncio.ensure_future(cdp.send("Page.screencastFrameAck", {"sessionId": params["sessionId"]}))
+                
+                cdp.on("Page.screencastFrame", on_frame)
+                await cdp.send("Page.startScreencast", {
+                    "format": "jpeg", "quality": 90,
+                    "maxWidth": width, "maxHeight": height, "everyNthFrame": 1
+                })
+                await asyncio.wait_for(first_frame.wait(), timeout=10)
+                
+                # 按帧率节拍写帧：编码跟不上时不再等待，帧数保持不变
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                frame_bytes = b""
+                for i in range(max(1, int(duration * fps))):
+                    delay = start + i / fps - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    if latest[0] is not None:
+                        frame_bytes = base64.b64decode(latest[0])
+                        latest[0] = None
+                    proc.stdin.write(frame_bytes)
+                    await proc.stdin.drain()
+                
+                await cdp.send("Page.stopScreencast")
+            finally:
+                await context.close()
+        except BaseException:
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            raise
+        finally:
+            _POOL.release_browser(browser)
         
-        return html
+        # 关闭stdin结束编码
+        proc.stdin.close()
+        stderr = await proc.stderr.read()
+        await proc.wait()
+        if proc.returncode != 0:
+            raise Exception(f"FFmpeg编码失败: {stderr.decode(errors='replace')}")
+        print(f"✅ 录屏编码完成: {output_path}")
+        return output_path
     
     async def _record_with_playwright(self, html_path: str, temp_dir: str,
                                      duration: float, width: int, height: int):
         """使用Playwright录制视频，返回生成的视频文件路径"""
-        async with async_playwright() as p:
-            # 启动浏览器
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu',
-                    '--hide-scrollbars',
-                    '--disable-web-security',  # 允许跨域资源加载
-                ]
-            )
-            
+        # 从常驻浏览器池借出浏览器，每次录制只新建带录像的context
+        browser = await _POOL.get_browser(_VIDEO_CHROMIUM_FLAGS)
+        try:
             # 创建上下文，设置视频录制目录
             context = await browser.new_context(
                 viewport={'width': width, 'height': height},
@@ -1228,87 +1979,108 @@ class HTMLVideoRecorderPlaywright:
                 record_video_size={'width': width, 'height': height},
                 ignore_https_errors=True  # 忽略HTTPS错误
             )
-            
-            # 创建页面
-            page = await context.new_page()
-            
-            # 加载HTML文件
-            await page.goto(f"file://{html_path}")
-            
-            # 等待页面加载完成和字体加载
-            await page.wait_for_load_state('networkidle')
-            await page.wait_for_timeout(1000)  # 额外等待1秒确保所有资源加载
-            
-            # 录制指定时长
-            await asyncio.sleep(duration)
-            
-            # 获取视频文件路径
-            video_path = None
-            if page.video:
-                video_path = await page.video.path()
-            
-            # 关闭上下文（这会触发视频保存）
-            await context.close()
-            await browser.close()
-            
-            # 等待一小段时间，确保文件已保存
-            await asyncio.sleep(1.0)
-            
-            # 如果video_path为空，尝试在temp_dir中查找最新的.webm文件
-            if not video_path or not os.path.exists(video_path):
-                webm_files = []
-                for file in os.listdir(temp_dir):
-                    if file.endswith('.webm'):
-                        file_path = os.path.join(temp_dir, file)
-                        webm_files.append((file_path, os.path.getmtime(file_path)))
+            try:
+                # 创建页面
+                page = await context.new_page()
                 
-                if webm_files:
-                    webm_files.sort(key=lambda x: x[1], reverse=True)
-                    video_path = webm_files[0][0]
-                    print(f"📹 找到录制的视频文件: {video_path}")
-                else:
-                    raise Exception(f"在目录中未找到录制的视频文件: {temp_dir}")
-            
-            return video_path
+                # 加载HTML文件
+                await page.goto(f"file://{html_path}")
+                
+                # 等待页面加载完成和字体加载
+                await page.wait_for_load_state('networkidle')
+                await page.wait_for_timeout(1000)  # 额外等待1秒确保所有资源加载
+                
+                # 录制指定时长：由页面内的requestAnimationFrame计时，页面也可提前设置window.__done结束录制
+                await page.evaluate(_RECORD_TIMER_JS, duration * 1000)
+                await page.wait_for_function("window.__done === true", timeout=duration * 1000 + 2000)
+                
+                # 获取视频文件路径
+                video_path = None
+                if page.video:
+                    video_path = await page.video.path()
+            finally:
+                # 关闭上下文（这会触发视频保存）
+                await context.close()
+        finally:
+            _POOL.release_browser(browser)
+        
+        # context.close()已等待录像写入完成，这里只确认文件大小在两次50ms采样间不再变化（最多约1秒）
+        if video_path:
+            last_size = -1
+            for _ in range(20):
+                size = os.path.getsize(video_path) if os.path.exists(video_path) else -1
+                if size > 0 and size == last_size:
+                    break
+                last_size = size
+                await asyncio.sleep(0.05)
+        
+        # 如果video_path为空，尝试在temp_dir中查找最新的.webm文件
+        if not video_path or not os.path.exists(video_path):
+            with os.scandir(temp_dir) as entries:
+                webm_files = [(entry.path, entry.stat().st_mtime) for entry in entries
+                              if entry.name.endswith('.webm')]
+            
+            if webm_files:
+                video_path = max(webm_files, key=lambda x: x[1])[0]
+                print(f"📹 找到录制的视频文件: {video_path}")
+            else:
+                raise Exception(f"在目录中未找到录制的视频文件: {temp_dir}")
+        
+        return video_path
     
-    def _convert_to_mp4(self, input_path: str, output_path: str, fps: int):
-        """使用FFmpeg转换视频格式"""
+    async def _convert_to_mp4(self, input_path: str, output_path: str, fps: int) -> str:
+        """使用FFmpeg转换视频格式，返回实际输出的视频路径（转换失败时为原始格式文件）"""
         try:
-            import subprocess
             
             if not os.path.exists(input_path):
                 raise FileNotFoundError(f"输入视频文件不存在: {input_path}")
             
             print(f"🎬 开始转换视频: {input_path} -> {output_path}")
             
+            # 先尝试直接封装为MP4（不重新编码，只复制码流）
+            remux_cmd = [
+                'ffmpeg', '-i', input_path,
+                '-c:v', 'copy',
+                '-an',
+                '-movflags', '+faststart',
+                output_path,
+                '-y'
+            ]
+            returncode, _ = await _run_ffmpeg(remux_cmd)
+            if returncode == 0:
+                print(f"✅ 视频封装完成（未重新编码）: {output_path}")
+                return output_path
+            
+            # 编码格式不被MP4支持时再用libx264转码（录屏视频无音轨）
             cmd = [
                 'ffmpeg', '-i', input_path,
                 '-c:v', 'libx264',
-                '-preset', 'medium',
+                '-preset', 'ultrafast',
                 '-crf', '23',
+                '-threads', '0',
                 '-r', str(fps),
                 '-pix_fmt', 'yuv420p',
+                '-an',
                 '-movflags', '+faststart',
                 output_path,
                 '-y'
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            returncode, stderr_tail = await _run_ffmpeg(cmd)
             
-            if result.returncode != 0:
-                print(f"⚠️ FFmpeg错误输出: {result.stderr}")
+            if returncode != 0:
+                print(f"⚠️ FFmpeg错误输出: {stderr_tail}")
                 if os.path.exists(input_path):
-                    import shutil
                     # 如果输入是webm，直接重命名为mp4
                     if input_path.endswith('.webm'):
-                        shutil.copy2(input_path, output_path.replace('.mp4', '.webm'))
+                        shutil.move(input_path, output_path.replace('.mp4', '.webm'))
                         print(f"⚠️ 使用原始WebM文件: {output_path.replace('.mp4', '.webm')}")
                         output_path = output_path.replace('.mp4', '.webm')
                     else:
-                        shutil.copy2(input_path, output_path)
+                        shutil.move(input_path, output_path)
                         print(f"⚠️ 直接复制视频文件: {output_path}")
                 else:
-                    raise Exception(f"FFmpeg转换失败: {result.stderr}")
+                    raise Exception(f"FFmpeg转换失败: {stderr_tail}")
             else:
                 print(f"✅ 视频转换完成: {output_path}")
                 
@@ -1317,14 +2089,15 @@ class HTMLVideoRecorderPlaywright:
             raise
         except Exception as e:
             print(f"⚠️ 视频格式转换失败: {str(e)}")
-            import shutil
             if os.path.exists(input_path):
                 webm_output_path = output_path.replace('.mp4', '.webm')
-                shutil.copy2(input_path, webm_output_path)
+                shutil.move(input_path, webm_output_path)
                 print(f"⚠️ 使用原始WebM文件: {webm_output_path}")
                 output_path = webm_output_path
             else:
                 raise Exception(f"视频转换失败且原始文件不存在: {input_path}")
+        
+        return output_path
 
 
 # 视频保存节点（与comfyui-videohelpersuite兼容）
@@ -1376,7 +2149,6 @@ class VideoSaveNode:
             
             # 导入ComfyUI的文件夹路径模块
             import folder_paths
-            from datetime import datetime
             
             # 获取输出目录
             output_dir = folder_paths.get_output_directory()
@@ -1399,20 +2171,21 @@ class VideoSaveNode:
             final_path = os.path.join(output_dir, final_filename)
             
             # 复制视频文件
-            import shutil
-            shutil.copy2(video_path, final_path)
+            _fast_copy(video_path, final_path)
             
             print(f"💾 视频已保存到: {final_path}")
             
-            # 更新视频信息
+            # 更新视频信息：JSON对象中尚无保存字段时直接在末尾追加，省去解析和重新序列化
             try:
-                video_info = json.loads(video_info_json) if video_info_json.strip() else {}
-            except:
+                video_info = _loads_json(video_info_json)
+            except json.JSONDecodeError:
+                video_info = {}
+            if not isinstance(video_info, dict):
                 video_info = {}
             
             video_info["saved_path"] = final_path
             video_info["saved_timestamp"] = timestamp
-            updated_info_json = json.dumps(video_info, ensure_ascii=False, indent=2)
+            updated_info_json = _dumps_json(video_info)
             
             return (final_path, updated_info_json)
             
@@ -1438,5 +2211,5 @@ try:
     from .html_frame_renderer import HTMLFrameRenderer
     NODE_CLASS_MAPPINGS["HTMLFrameRenderer"] = HTMLFrameRenderer
     NODE_DISPLAY_NAME_MAPPINGS["HTMLFrameRenderer"] = "HTML帧渲染器（截图修复版）"
-except:
+except ImportError:
     pass